@@ -0,0 +1,108 @@
+# backend/bench_memory.py
+"""
+内存基准：验证流式比对的峰值内存不随文档长度增长
+
+用法 (在 backend 目录下):
+    python bench_memory.py              # 默认 100 / 400 / 1600 页
+    python bench_memory.py 200 2000     # 自定义页数
+
+为了只测量比对流水线本身，这里用一个按需生成页面的假 collection 代替 ChromaDB 的检索结果，
+并用固定回复代替 LLM 调用；SQL 部分使用独立的内存 SQLite。
+"""
+import os
+import sys
+import tracemalloc
+import zlib
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.core import Base
+from database.models import Document, ComparisonTask, ComparisonMatch, ProcessStatus
+from database.vector_store import vector_db_client
+from services.comparator import Comparator
+
+PAGE_CHARS = 3000  # 约等于一页论文正文
+
+
+def _page_text(doc_id: int, idx: int) -> str:
+    return (f"doc {doc_id} page {idx} " * (PAGE_CHARS // 16))[:PAGE_CHARS]
+
+
+class SyntheticCollection:
+    """只实现比对用到的 get / query，页面文本按需生成，不常驻内存"""
+
+    def __init__(self, pages: dict[int, int]):
+        self.pages = pages  # doc_id -> 页数
+
+    def get(self, where, include, limit=None, offset=0):
+        doc_id = where["doc_id"]
+        end = self.pages[doc_id] if limit is None else min(self.pages[doc_id], offset + limit)
+        idxs = range(offset, end)
+        return {
+            "documents": [_page_text(doc_id, i) for i in idxs],
+            "metadatas": [{"doc_id": doc_id, "page": i + 1} for i in idxs],
+        }
+
+    def query(self, query_texts, n_results, where, include):
+        # 每 4 个切片命中一次，使命中数与文档长度成正比 (crc32 保证每次运行结果一致)
+        h = zlib.crc32(query_texts[0].encode()) % 4
+        distance = 0.05 if h == 0 else 0.8
+        return {
+            "documents": [[_page_text(where["doc_id"], 0)[:500]]],
+            "metadatas": [[{"page": 1}]],
+            "distances": [[distance]],
+        }
+
+
+class StubLLM:
+    def __init__(self):
+        reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="基准测试回复"))])
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: reply))
+
+
+def run_once(pages: int) -> tuple[int, int]:
+    """跑一次完整比对，返回 (峰值内存字节, 命中条数)"""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    source = Document(filename="source.pdf", file_path="missing.pdf", status=ProcessStatus.COMPLETED)
+    target = Document(filename="target.pdf", file_path="missing.pdf", status=ProcessStatus.COMPLETED)
+    db.add_all([source, target])
+    db.commit()
+    task = ComparisonTask(source_doc_id=source.id, target_doc_id=target.id)
+    db.add(task)
+    db.commit()
+
+    vector_db_client.collection = SyntheticCollection({source.id: 10, target.id: pages})
+    comparator = Comparator(db)
+    comparator.llm = StubLLM()
+
+    tracemalloc.start()
+    comparator.compare(task.id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    hits = db.query(ComparisonMatch).filter(ComparisonMatch.task_id == task.id).count()
+    db.close()
+    engine.dispose()
+    return peak, hits
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 400, 1600]
+    results = []
+    for pages in sizes:
+        peak, hits = run_once(pages)
+        results.append(peak)
+        print(f"📊 {pages:>6} pages | {hits:>6} matches | peak {peak / 1024 / 1024:.2f} MiB")
+
+    growth = results[-1] / results[0]
+    print(f"📈 Peak memory grew {growth:.2f}x for {sizes[-1] / sizes[0]:.0f}x more pages.")
@@ -1,6 +1,6 @@
 # backend/database/models.py
 import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Text, JSON, Float
 from sqlalchemy.orm import relationship
 import enum
 from .core import Base
@@ -43,9 +43,62 @@ class ComparisonTask(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # 最重要的字段：存储 JSON 格式的对比报告
-    # 例如: {"score": 0.45, "matches": [...]}
+    # 例如: {"summary": {...}, "macro_analysis": {...}}
+    # 逐段命中不放在这里，而是流式写入 comparison_matches 表，读取时再拼回 "matches"
     result_json = Column(JSON, nullable=True)
 
     # 关系属性
     source_doc = relationship("Document", foreign_keys=[source_doc_id], back_populates="source_tasks")
-    target_doc = relationship("Document", foreign_keys=[target_doc_id], back_populates="target_tasks")
\ No newline at end of file
+    target_doc = relationship("Document", foreign_keys=[target_doc_id], back_populates="target_tasks")
+    matches = relationship("ComparisonMatch", back_populates="task", order_by="ComparisonMatch.match_index", cascade="all, delete-orphan")
+
+class ComparisonMatch(Base):
+    __tablename__ = "comparison_matches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("comparison_tasks.id"), nullable=False, index=True)
+
+    # 命中在报告中的序号 (对应前端的 match.id)
+    match_index = Column(Integer, nullable=False)
+    match_type = Column(String, nullable=False)   # verbatim / paraphrasing
+    score = Column(Float, nullable=False)
+
+    target_text = Column(Text, nullable=False)
+    target_page = Column(Integer, default=0)
+    source_text = Column(Text, nullable=False)
+    source_page = Column(Integer, default=0)
+
+    ai_analysis = Column(Text, nullable=True)
+    masked_avg_score = Column(Float, nullable=True)
+    mask_runs = Column(Integer, nullable=True)
+    mask_ratio = Column(Float, nullable=True)
+
+    task = relationship("ComparisonTask", back_populates="matches")
+
+    def to_dict(self):
+        """还原为报告 JSON 中的 match 结构"""
+        return {
+            "id": self.match_index,
+            "type": self.match_type,
+            "score": self.score,
+            "target_text": self.target_text,
+            "target_page": self.target_page,
+            "source_text": self.source_text,
+            "source_page": self.source_page,
+            "ai_analysis": self.ai_analysis,
+            "masked_avg_score": self.masked_avg_score,
+            "mask_runs": self.mask_runs,
+            "mask_ratio": self.mask_ratio,
+        }
+
+class ComparisonBatch(Base):
+    __tablename__ = "comparison_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # 批量任务状态 (各子任务的状态仍记录在各自的 ComparisonTask 上)
+    status = Column(Enum(ProcessStatus), default=ProcessStatus.PENDING)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    # 该批次包含的 ComparisonTask ID 列表，例如 [12, 13, 14]
+    task_ids = Column(JSON, nullable=False, default=list)
@@ -1,33 +1,47 @@
 # backend/database/vector_store.py
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
 import os
 
 class VectorDB:
     def __init__(self, persist_dir="./chroma_db"):
         # 初始化 ChromaDB 客户端，设置持久化存储
         self.client = chromadb.PersistentClient(path=persist_dir)
+
+        # Chroma 默认使用内置的 all-MiniLM-L6-v2，这里显式持有一份，方便批量比对时在内存中向量化查询文本
+        # 如果你要用 OpenAI，后续我们再在这里替换
+        self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
         
         # 获取或创建集合 (Collection)
         # 类似于 SQL 中的 Table
         self.collection = self.client.get_or_create_collection(
             name="paper_chunks",
-            # 这里如果不指定 embedding_function，Chroma 会默认使用内置的 all-MiniLM-L6-v2
-            # 如果你要用 OpenAI，后续我们再在这里替换
+            embedding_function=self.embedding_function,
         )
 
-    def add_documents(self, doc_id: int, texts: list[str], metadatas: list[dict] = None):
+    @property
+    def distance_space(self) -> str:
+        """集合使用的距离度量 (l2 / cosine / ip)，未配置时 Chroma 默认为 l2"""
+        return (self.collection.metadata or {}).get("hnsw:space", "l2")
+
+    def embed(self, texts: list[str]):
+        """用与集合相同的 embedding 模型向量化文本"""
+        return self.embedding_function(texts)
+
+    def add_documents(self, doc_id: int, texts: list[str], metadatas: list[dict] = None, start_index: int = 0):
         """
         将文档切片存入向量库
         :param doc_id: SQL数据库中的 Document ID (用于关联)
         :param texts: 文本切片列表
         :param metadatas: 每个切片的元数据 (例如页码: {"page": 1})
+        :param start_index: 分批写入时本批第一个切片的序号，保证 chunk id 不重复
         """
         if not texts:
             return
             
         # 生成唯一的 chunk id: doc_1_0, doc_1_1, ...
-        ids = [f"doc_{doc_id}_{i}" for i in range(len(texts))]
+        ids = [f"doc_{doc_id}_{start_index + i}" for i in range(len(texts))]
         
         # 确保每个 metadata 都包含 doc_id，方便后续删除或过滤
         if metadatas is None:
@@ -72,6 +86,38 @@ class VectorDB:
         )
         return result
 
+    def get_document_embeddings(self, doc_id: int):
+        """
+        获取指定文档的所有切片文本、元数据和向量
+        用于批量比对时把“基准论文”整体加载进内存，避免每个待测文档重复检索
+        """
+        result = self.collection.get(
+            where={"doc_id": doc_id},
+            include=["documents", "metadatas", "embeddings"]
+        )
+        return result
+
+    def iter_document_chunks(self, doc_id: int, batch_size: int = 32):
+        """
+        按固定窗口分页读取指定文档的切片，逐个 yield (text, metadata)
+        与 get_document_chunks 不同，内存中最多只保留 batch_size 个切片，适合超长文档
+        """
+        offset = 0
+        while True:
+            batch = self.collection.get(
+                where={"doc_id": doc_id},
+                include=["documents", "metadatas"],
+                limit=batch_size,
+                offset=offset,
+            )
+            texts = batch["documents"]
+            if not texts:
+                return
+            yield from zip(texts, batch["metadatas"])
+            if len(texts) < batch_size:
+                return
+            offset += batch_size
+
     def query_context(self, query_text: str, filter_doc_id: int, top_k: int = 1):
         """
         在指定的文档 (filter_doc_id) 中搜索与 query_text 相似的段落
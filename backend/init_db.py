@@ -1,6 +1,6 @@
 # backend/init_db.py
 from database.core import engine, Base
-from database.models import Document, ComparisonTask
+from database.models import Document, ComparisonTask, ComparisonMatch, ComparisonBatch
 from database.vector_store import vector_db_client
 
 def init_database():
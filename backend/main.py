@@ -10,8 +10,9 @@ from database.core import get_db, Base, engine
 from database.models import Document, ProcessStatus
 from services.pdf_processor import process_document_background
 
-from database.models import ComparisonTask
+from database.models import ComparisonTask, ComparisonBatch
 from services.comparator import run_compare_task
+from services.batch_comparator import run_batch_compare_task, build_batch_report
 from pydantic import BaseModel
 
 # Load environment variables from .env if present
@@ -22,6 +23,11 @@ class CompareRequest(BaseModel):
     source_doc_id: int
     target_doc_id: int
 
+class BatchCompareRequest(BaseModel):
+    # 一对多：source_doc_ids 只放一个基准文档；多对多：两边都放多个
+    source_doc_ids: list[int]
+    target_doc_ids: list[int]
+
 # 确保上传目录存在
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -144,9 +150,74 @@ def get_comparison_result(task_id: int, db: Session = Depends(get_db)):
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    result = task.result_json # 如果完成了，这里会有大段 JSON 数据
+    # 逐段命中单独存表，这里拼回报告的 "matches" 字段 (旧任务的 matches 仍在 JSON 中)
+    if task.status == ProcessStatus.COMPLETED and result is not None and "matches" not in result:
+        result = {**result, "matches": [m.to_dict() for m in task.matches]}
+
     return {
         "id": task.id,
         "status": task.status,
         "created_at": task.created_at,
-        "result": task.result_json # 如果完成了，这里会有大段 JSON 数据
+        "result": result
+    }
+
+@app.post("/api/compare/batch")
+def start_batch_comparison(
+    request: BatchCompareRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    批量对比：每个基准文档 × 每个待测文档各建一个任务，基准侧只加载一次并在任务间共享
+    """
+    source_ids = list(dict.fromkeys(request.source_doc_ids))
+    target_ids = list(dict.fromkeys(request.target_doc_ids))
+    if not source_ids or not target_ids:
+        raise HTTPException(status_code=400, detail="source_doc_ids and target_doc_ids must not be empty")
+
+    # 1. 检查文档是否存在且已向量化
+    docs = db.query(Document).filter(Document.id.in_(source_ids + target_ids)).all()
+    docs_by_id = {d.id: d for d in docs}
+    if any(doc_id not in docs_by_id for doc_id in source_ids + target_ids):
+        raise HTTPException(status_code=404, detail="One or more documents not found")
+    if any(d.status != ProcessStatus.COMPLETED for d in docs):
+        raise HTTPException(status_code=400, detail="Documents are not yet processed (embedded).")
+
+    # 2. 为每一对 (跳过自己和自己) 创建任务记录
+    tasks = [
+        ComparisonTask(source_doc_id=s_id, target_doc_id=t_id, status=ProcessStatus.PENDING)
+        for s_id in source_ids
+        for t_id in target_ids
+        if s_id != t_id
+    ]
+    if not tasks:
+        raise HTTPException(status_code=400, detail="No document pairs to compare")
+    db.add_all(tasks)
+    db.commit()
+
+    new_batch = ComparisonBatch(task_ids=[t.id for t in tasks], status=ProcessStatus.PENDING)
+    db.add(new_batch)
+    db.commit()
+    db.refresh(new_batch)
+
+    # 3. 触发后台批量算法
+    background_tasks.add_task(run_batch_compare_task, new_batch.id)
+
+    return {"batch_id": new_batch.id, "task_ids": new_batch.task_ids, "status": "queued"}
+
+@app.get("/api/compare/batch/{batch_id}")
+def get_batch_comparison_result(batch_id: int, db: Session = Depends(get_db)):
+    """
+    轮询接口：查看批量进度、得分矩阵和按得分排序的各对报告 (逐段命中请用 /api/compare/{task_id} 查看)
+    """
+    batch = db.query(ComparisonBatch).filter(ComparisonBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    return {
+        "id": batch.id,
+        "status": batch.status,
+        "created_at": batch.created_at,
+        "result": build_batch_report(db, batch)
     }
@@ -0,0 +1,129 @@
+# backend/services/batch_comparator.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from sqlalchemy.orm import Session
+
+from database.models import ComparisonBatch, ComparisonTask, ProcessStatus, Document
+from services.comparator import Comparator, SourceIndex
+
+# how many target comparisons run at once inside a batch
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+
+
+def _run_pair(task_id: int, source_index: SourceIndex):
+    """Worker: one target comparison with its own session against a shared source index."""
+    from database.core import SessionLocal
+
+    db = SessionLocal()
+    try:
+        Comparator(db).compare(task_id, source_index=source_index)
+    finally:
+        db.close()
+
+
+def _load_source(db: Session, comparator: Comparator, source_doc_id: int) -> SourceIndex | Exception:
+    """Load one source index; a failure is returned (not raised) so it only fails that source's pairs."""
+    try:
+        source_doc = db.query(Document).filter(Document.id == source_doc_id).first()
+        if not source_doc:
+            raise Exception("Document not found")
+        source_index = comparator.load_source_index(source_doc)
+        print(f"   Loaded source {source_doc_id} ({len(source_index.texts)} chunks)")
+        return source_index
+    except Exception as e:
+        print(f"❌ [Batch] Failed to load source {source_doc_id}: {e}")
+        return e
+
+
+def build_batch_report(db: Session, batch: ComparisonBatch) -> Dict[str, Any]:
+    """Score matrix (sources x targets) plus pairs ranked by overlap score."""
+    tasks = db.query(ComparisonTask).filter(ComparisonTask.id.in_(batch.task_ids)).all()
+    tasks_by_id = {t.id: t for t in tasks}
+    ordered = [tasks_by_id[tid] for tid in batch.task_ids if tid in tasks_by_id]
+
+    sources = list(dict.fromkeys(t.source_doc_id for t in ordered))
+    targets = list(dict.fromkeys(t.target_doc_id for t in ordered))
+    scores: List[List[float | None]] = [[None] * len(targets) for _ in sources]
+
+    ranking = []
+    for t in ordered:
+        summary = (t.result_json or {}).get("summary", {})
+        score = summary.get("total_score") if t.status == ProcessStatus.COMPLETED else None
+        scores[sources.index(t.source_doc_id)][targets.index(t.target_doc_id)] = score
+        ranking.append(
+            {
+                "task_id": t.id,
+                "source_doc_id": t.source_doc_id,
+                "target_doc_id": t.target_doc_id,
+                "status": t.status,
+                "total_score": score,
+                "verdict": summary.get("verdict"),
+                "report": t.result_json,
+            }
+        )
+    # highest overlap first; unfinished / failed pairs go last
+    ranking.sort(key=lambda r: (r["total_score"] is None, -(r["total_score"] or 0)))
+
+    return {
+        "sources": sources,
+        "targets": targets,
+        "scores": scores,
+        "ranking": ranking,
+    }
+
+
+# FastAPI background entry
+def run_batch_compare_task(batch_id: int):
+    from database.core import SessionLocal
+
+    db = SessionLocal()
+    try:
+        batch = db.query(ComparisonBatch).filter(ComparisonBatch.id == batch_id).first()
+        if not batch:
+            return
+
+        print(f"🚀 [Batch] Starting batch {batch_id} with {len(batch.task_ids)} pairs...")
+        batch.status = ProcessStatus.PROCESSING
+        db.commit()
+
+        try:
+            tasks = db.query(ComparisonTask).filter(ComparisonTask.id.in_(batch.task_ids)).all()
+            comparator = Comparator(db)
+
+            # load each source's intro + embeddings once, shared by all of its targets;
+            # a source that fails to load only fails its own pairs
+            indexes: Dict[int, SourceIndex | Exception] = {}
+            jobs = []
+            for task in tasks:
+                if task.source_doc_id not in indexes:
+                    indexes[task.source_doc_id] = _load_source(db, comparator, task.source_doc_id)
+                source_index = indexes[task.source_doc_id]
+                if isinstance(source_index, Exception):
+                    task.status = ProcessStatus.FAILED
+                    task.result_json = {"error": f"Failed to load source document {task.source_doc_id}: {source_index}"}
+                    continue
+                jobs.append((task.id, source_index))
+            db.commit()
+
+            with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+                list(pool.map(lambda job: _run_pair(*job), jobs))
+
+            batch.status = ProcessStatus.COMPLETED
+            db.commit()
+            print(f"✅ [Batch] Batch {batch_id} Finished!")
+
+        except Exception as e:
+            print(f"❌ [Batch] Error: {e}")
+            db.rollback()
+            batch.status = ProcessStatus.FAILED
+            pending = db.query(ComparisonTask).filter(
+                ComparisonTask.id.in_(batch.task_ids), ComparisonTask.status == ProcessStatus.PENDING
+            )
+            for task in pending:
+                task.status = ProcessStatus.FAILED
+                task.result_json = {"error": str(e)}
+            db.commit()
+    finally:
+        db.close()
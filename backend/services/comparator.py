@@ -1,14 +1,15 @@
 # backend/services/comparator.py
 import os
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 
 import fitz  # PyMuPDF
+import numpy as np
 from dotenv import load_dotenv
 from openai import OpenAI
 from sqlalchemy.orm import Session
 
-from database.models import ComparisonTask, ProcessStatus, Document
+from database.models import ComparisonTask, ComparisonMatch, ProcessStatus, Document
 from database.vector_store import vector_db_client
 
 # ---- configurable thresholds ----
@@ -18,6 +19,7 @@ THRESHOLD_SUSPICIOUS = float(os.getenv("SIM_THRESHOLD_SUSPICIOUS", 0.4))  # dist
 # chunking
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 100))
+CHUNK_WINDOW = int(os.getenv("CHUNK_WINDOW", 32))  # target pages fetched / matches flushed per batch
 
 # masking robustness
 MASK_RUNS = int(os.getenv("MASK_RUNS", 3))        # how many masked trials
@@ -29,6 +31,59 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 30))
 
 
+# (distance, source_text, source_meta) of the nearest source chunk, or None if the source is empty
+SourceHit = Tuple[float, str, Dict[str, Any]] | None
+
+
+class SourceIndex:
+    """In-memory view of a source document shared by every target in a batch.
+
+    Holds the intro text and all chunk embeddings so that each target only pays for
+    embedding its own chunks; nearest-neighbour search reproduces Chroma's distances.
+    """
+
+    def __init__(
+        self,
+        doc_id: int,
+        intro: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings,
+        space: str = "l2",
+    ):
+        self.doc_id = doc_id
+        self.intro = intro
+        self.texts = texts
+        self.metadatas = metadatas
+        self.space = space
+        if texts:
+            self.embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+        else:  # e.g. scanned PDFs with no extractable text; search() returns all None
+            self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        if space == "cosine":
+            norms = np.linalg.norm(self.embeddings, axis=1, keepdims=True)
+            self.embeddings = self.embeddings / np.maximum(norms, 1e-12)
+        self.sq_norms = (self.embeddings ** 2).sum(axis=1)
+
+    def search(self, texts: List[str]) -> List[SourceHit]:
+        """Nearest source chunk for each text, embedded in a single call."""
+        if not texts or not self.texts:
+            return [None] * len(texts)
+        query = np.asarray(vector_db_client.embed(texts), dtype=np.float32)
+        if self.space == "cosine":
+            query = query / np.maximum(np.linalg.norm(query, axis=1, keepdims=True), 1e-12)
+        dots = query @ self.embeddings.T
+        if self.space in ("cosine", "ip"):
+            distances = 1.0 - dots
+        else:  # squared L2, same as Chroma
+            distances = (query ** 2).sum(axis=1)[:, None] - 2 * dots + self.sq_norms[None, :]
+        best = distances.argmin(axis=1)
+        return [
+            (float(distances[row, col]), self.texts[col], self.metadatas[col])
+            for row, col in enumerate(best)
+        ]
+
+
 class Comparator:
     def __init__(self, db: Session):
         self.db = db
@@ -37,8 +92,24 @@ class Comparator:
             raise RuntimeError("OPENAI_API_KEY is not set. Please create a .env file.")
         self.llm = OpenAI(api_key=api_key)
 
-    def compare(self, task_id: int):
-        """Top-Down + Bottom-Up + Masked robustness."""
+    def load_source_index(self, source_doc: Document) -> SourceIndex:
+        """Load a source's intro and chunk embeddings once for reuse across many targets."""
+        data = vector_db_client.get_document_embeddings(source_doc.id)
+        return SourceIndex(
+            source_doc.id,
+            self._extract_intro(source_doc.file_path),
+            data["documents"],
+            data["metadatas"],
+            data["embeddings"],
+            vector_db_client.distance_space,
+        )
+
+    def compare(self, task_id: int, source_index: SourceIndex | None = None):
+        """Top-Down + Bottom-Up + Masked robustness.
+
+        ``source_index`` lets batch runs share the preloaded source side instead of
+        re-reading the PDF and re-querying the vector store for every target.
+        """
         task = self.db.query(ComparisonTask).filter(ComparisonTask.id == task_id).first()
         if not task:
             return
@@ -55,64 +126,41 @@ class Comparator:
                 raise Exception("Documents not found")
 
             # 1) Top-Down macro compare (abstract/introduction)
-            source_intro = self._extract_intro(source_doc.file_path)
+            source_intro = source_index.intro if source_index else self._extract_intro(source_doc.file_path)
             target_intro = self._extract_intro(target_doc.file_path)
             macro_analysis = self._analyze_framework(target_intro, source_intro)
 
             # 2) Bottom-Up micro compare (vector search + LLM)
-            target_data = vector_db_client.get_document_chunks(target_doc.id)
-            target_texts = target_data["documents"]
-            target_metas = target_data["metadatas"]
-            if not target_texts:
+            # target chunks are paged from the vector store and matches are flushed to
+            # comparison_matches as they are found, so memory stays flat with document size
+            self.db.query(ComparisonMatch).filter(ComparisonMatch.task_id == task.id).delete()
+            self.db.commit()
+
+            stats = {"total_chunks": 0, "suspicious_chunks": 0, "mask_sum": 0.0, "mask_hits": 0, "robust_hits": 0}
+            pending = 0
+            for match in self._iter_matches(source_doc.id, target_doc.id, stats, source_index):
+                self.db.add(
+                    ComparisonMatch(
+                        task_id=task.id,
+                        match_index=match.pop("id"),
+                        match_type=match.pop("type"),
+                        **match,
+                    )
+                )
+                pending += 1
+                if pending >= CHUNK_WINDOW:
+                    self.db.commit()
+                    pending = 0
+            self.db.commit()
+
+            total_chunks = stats["total_chunks"]
+            suspicious_count = stats["suspicious_chunks"]
+            if not total_chunks:
                 raise Exception("Target document has no chunks found.")
 
-            matches: List[Dict[str, Any]] = []
-            total_chunks = 0
-            suspicious_count = 0
-            mask_scores: List[float] = []
-
-            for page_idx, t_text in enumerate(target_texts):
-                sub_chunks = self._chunk_text(t_text)
-                for sub_text in sub_chunks:
-                    total_chunks += 1
-                    result = vector_db_client.query_context(sub_text, source_doc.id, top_k=1)
-                    if not result["distances"][0]:
-                        continue
-
-                    distance = result["distances"][0][0]
-                    s_text = result["documents"][0][0]
-                    s_meta = result["metadatas"][0][0]
-
-                    if distance < THRESHOLD_SUSPICIOUS:
-                        match_type = "paraphrasing" if distance >= THRESHOLD_EXACT else "verbatim"
-                        ai_verdict = self._analyze_with_llm(sub_text, s_text)
-
-                        masked_avg = self._mask_robust_score(sub_text, source_doc.id)
-                        if masked_avg is not None:
-                            mask_scores.append(masked_avg)
-
-                        matches.append(
-                            {
-                                "id": len(matches),
-                                "type": match_type,
-                                "score": round((1 - distance) * 100, 2),
-                                "target_text": sub_text,
-                                "target_page": target_metas[page_idx].get("page", 0),
-                                "source_text": s_text,
-                                "source_page": s_meta.get("page", 0),
-                                "ai_analysis": ai_verdict,
-                                "masked_avg_score": masked_avg,
-                                "mask_runs": MASK_RUNS,
-                                "mask_ratio": MASK_RATIO,
-                            }
-                        )
-                        suspicious_count += 1
-
-                if page_idx % 3 == 0:
-                    print(f"   Processed page {page_idx+1}/{len(target_texts)}...")
-
-            final_score = round((suspicious_count / total_chunks) * 100, 2) if total_chunks else 0.0
+            final_score = round((suspicious_count / total_chunks) * 100, 2)
 
+            # matches live in comparison_matches; the API merges them back into "matches"
             report: Dict[str, Any] = {
                 "summary": {
                     "total_score": final_score,
@@ -121,21 +169,15 @@ class Comparator:
                     "suspicious_chunks": suspicious_count,
                 },
                 "macro_analysis": macro_analysis,
-                "matches": matches,
             }
 
-            if mask_scores:
-                robust_hits = sum(
-                    1
-                    for m in matches
-                    if m.get("masked_avg_score") is not None and m["masked_avg_score"] >= m["score"] * 0.8
-                )
+            if stats["mask_hits"]:
                 report["mask_check"] = {
                     "runs": MASK_RUNS,
                     "ratio": MASK_RATIO,
-                    "avg_masked_score": round(sum(mask_scores) / len(mask_scores), 2),
-                    "robust_hits": robust_hits,
-                    "total_hits": len(mask_scores),
+                    "avg_masked_score": round(stats["mask_sum"] / stats["mask_hits"], 2),
+                    "robust_hits": stats["robust_hits"],
+                    "total_hits": stats["mask_hits"],
                 }
 
             # 3) Final verdict
@@ -148,11 +190,76 @@ class Comparator:
 
         except Exception as e:
             print(f"❌ [Comparator] Error: {e}")
+            self.db.rollback()
+            self.db.query(ComparisonMatch).filter(ComparisonMatch.task_id == task.id).delete()
             task.status = ProcessStatus.FAILED
             task.result_json = {"error": str(e)}
             self.db.commit()
 
     # ---------- helpers ----------
+    def _iter_matches(
+        self,
+        source_id: int,
+        target_id: int,
+        stats: Dict[str, Any],
+        source_index: SourceIndex | None = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Page through target chunks and yield suspicious matches one at a time.
+
+        Running totals are accumulated into ``stats`` instead of keeping the matches around.
+        """
+        for page_idx, (t_text, t_meta) in enumerate(vector_db_client.iter_document_chunks(target_id, CHUNK_WINDOW)):
+            sub_chunks = self._chunk_text(t_text)
+            for sub_text, hit in zip(sub_chunks, self._search_source(sub_chunks, source_id, source_index)):
+                stats["total_chunks"] += 1
+                if hit is None:
+                    continue
+
+                distance, s_text, s_meta = hit
+
+                if distance < THRESHOLD_SUSPICIOUS:
+                    match_type = "paraphrasing" if distance >= THRESHOLD_EXACT else "verbatim"
+                    ai_verdict = self._analyze_with_llm(sub_text, s_text)
+                    score = round((1 - distance) * 100, 2)
+
+                    masked_avg = self._mask_robust_score(sub_text, source_id, source_index)
+                    if masked_avg is not None:
+                        stats["mask_sum"] += masked_avg
+                        stats["mask_hits"] += 1
+                        if masked_avg >= score * 0.8:
+                            stats["robust_hits"] += 1
+
+                    yield {
+                        "id": stats["suspicious_chunks"],
+                        "type": match_type,
+                        "score": score,
+                        "target_text": sub_text,
+                        "target_page": t_meta.get("page", 0),
+                        "source_text": s_text,
+                        "source_page": s_meta.get("page", 0),
+                        "ai_analysis": ai_verdict,
+                        "masked_avg_score": masked_avg,
+                        "mask_runs": MASK_RUNS,
+                        "mask_ratio": MASK_RATIO,
+                    }
+                    stats["suspicious_chunks"] += 1
+
+            if page_idx % 3 == 0:
+                print(f"   Processed page {page_idx+1}...")
+
+    def _search_source(self, texts: List[str], source_id: int, source_index: SourceIndex | None) -> List[SourceHit]:
+        """Nearest source chunk for each text, from the shared index or the vector store."""
+        if source_index is not None:
+            return source_index.search(texts)
+        hits: List[SourceHit] = []
+        for text in texts:
+            result = vector_db_client.query_context(text, source_id, top_k=1)
+            if not result["distances"][0]:
+                hits.append(None)
+                continue
+            hits.append((result["distances"][0][0], result["documents"][0][0], result["metadatas"][0][0]))
+        return hits
+
     def _extract_intro(self, pdf_path: str, pages: int = 2, max_chars: int = 4000) -> str:
         """Extract first pages as intro for macro compare."""
         try:
@@ -231,19 +338,17 @@ class Comparator:
         )
         return resp.choices[0].message.content.strip()
 
-    def _mask_robust_score(self, text: str, source_id: int) -> float | None:
+    def _mask_robust_score(self, text: str, source_id: int, source_index: SourceIndex | None = None) -> float | None:
         """Random masking robustness check; returns avg similarity."""
         if MASK_RUNS <= 0 or MASK_RATIO <= 0:
             return None
 
-        scores = []
-        for _ in range(MASK_RUNS):
-            masked = self._mask_text(text, MASK_RATIO)
-            result = vector_db_client.query_context(masked, source_id, top_k=1)
-            if not result["distances"][0]:
-                continue
-            dist = result["distances"][0][0]
-            scores.append(round((1 - dist) * 100, 2))
+        masked = [self._mask_text(text, MASK_RATIO) for _ in range(MASK_RUNS)]
+        scores = [
+            round((1 - hit[0]) * 100, 2)
+            for hit in self._search_source(masked, source_id, source_index)
+            if hit is not None
+        ]
         if not scores:
             return None
         return round(sum(scores) / len(scores), 2)
@@ -263,7 +368,6 @@ class Comparator:
     def _summarize_final(self, macro: Dict[str, str], report: Dict[str, Any]) -> str:
         """Combine macro + micro findings into a final verdict."""
         summary = report.get("summary", {})
-        matches = report.get("matches", [])
         mask_check = report.get("mask_check")
         mask_line = ""
         if mask_check:
@@ -274,7 +378,7 @@ class Comparator:
 
         user_prompt = (
             f"宏观分析:\n{macro}\n\n"
-            f"微观命中条数: {len(matches)}, 总体得分: {summary.get('total_score', 0)}%\n"
+            f"微观命中条数: {summary.get('suspicious_chunks', 0)}, 总体得分: {summary.get('total_score', 0)}%\n"
             f"{mask_line}"
             "请输出简短中文判决（<=60字），指出是否存在抄袭风险，并概述主要依据。"
         )
@@ -5,24 +5,32 @@ from sqlalchemy.orm import Session
 from database.models import Document, ProcessStatus
 from database.vector_store import vector_db_client
 
+# 每批写入向量库的页数，长文档不会一次性全部驻留内存
+CHUNK_WINDOW = int(os.getenv("CHUNK_WINDOW", 32))
+
+def iter_pdf_pages(file_path: str):
+    """
+    使用 PyMuPDF 逐页提取 PDF 文本，yield (text, metadata)
+    """
+    with fitz.open(file_path) as doc:
+        for page_num, page in enumerate(doc):
+            text = page.get_text()
+            if len(text.strip()) < 50:  # 跳过几乎空白的页面
+                continue
+
+            # 简单的切片策略：每一页作为一个 Chunk
+            # 进阶优化：这里应该使用 LangChain 的 RecursiveCharacterTextSplitter 进行更细致的切分
+            yield text, {"page": page_num + 1}
+
 def parse_pdf(file_path: str):
     """
     使用 PyMuPDF 提取 PDF 文本，返回文本列表（按页）
     """
-    doc = fitz.open(file_path)
     text_chunks = []
     metadatas = []
-
-    for page_num, page in enumerate(doc):
-        text = page.get_text()
-        if len(text.strip()) < 50:  # 跳过几乎空白的页面
-            continue
-        
-        # 简单的切片策略：每一页作为一个 Chunk
-        # 进阶优化：这里应该使用 LangChain 的 RecursiveCharacterTextSplitter 进行更细致的切分
+    for text, meta in iter_pdf_pages(file_path):
         text_chunks.append(text)
-        metadatas.append({"page": page_num + 1})
-        
+        metadatas.append(meta)
     return text_chunks, metadatas
 
 def process_document_background(doc_id: int, file_path: str, db: Session):
@@ -37,13 +45,21 @@ def process_document_background(doc_id: int, file_path: str, db: Session):
         doc_record.status = ProcessStatus.PROCESSING
         db.commit()
 
-        # 2. 解析 PDF
-        texts, metadatas = parse_pdf(file_path)
-        print(f"📄 Extracted {len(texts)} pages from PDF.")
-
-        # 3. 存入向量数据库 (ChromaDB)
+        # 2. 逐页解析 PDF，3. 按 CHUNK_WINDOW 分批存入向量数据库 (ChromaDB)
         # 注意：这里会自动调用 Embedding 模型，可能会花几秒钟
-        vector_db_client.add_documents(doc_id, texts, metadatas)
+        texts, metadatas = [], []
+        total = 0
+        for text, meta in iter_pdf_pages(file_path):
+            texts.append(text)
+            metadatas.append(meta)
+            if len(texts) >= CHUNK_WINDOW:
+                vector_db_client.add_documents(doc_id, texts, metadatas, start_index=total)
+                total += len(texts)
+                texts, metadatas = [], []
+        if texts:
+            vector_db_client.add_documents(doc_id, texts, metadatas, start_index=total)
+            total += len(texts)
+        print(f"📄 Extracted {total} pages from PDF.")
 
         # 4. 标记为完成
         doc_record.status = ProcessStatus.COMPLETED
@@ -52,6 +68,11 @@ def process_document_background(doc_id: int, file_path: str, db: Session):
 
     except Exception as e:
         print(f"❌ [Task] Error processing document: {e}")
+        # 分批写入可能已存入部分切片，失败时一并清理，避免残留孤立向量
+        try:
+            vector_db_client.delete_document(doc_id)
+        except Exception as cleanup_error:
+            print(f"⚠️  Failed to clean up vectors for Document ID {doc_id}: {cleanup_error}")
         doc_record = db.query(Document).filter(Document.id == doc_id).first()
         doc_record.status = ProcessStatus.FAILED
         doc_record.error_message = str(e)
@@ -27,4 +27,19 @@ export const api = {
     const response = await axios.get(`${API_BASE}/compare/${taskId}`);
     return response.data;
   },
+
+  // 批量对比：一对多 / 多对多
+  startBatchComparison: async (sourceIds: number[], targetIds: number[]) => {
+    const response = await axios.post(`${API_BASE}/compare/batch`, {
+      source_doc_ids: sourceIds,
+      target_doc_ids: targetIds,
+    });
+    return response.data; // { batch_id, task_ids, status }
+  },
+
+  // 获取批量结果 (轮询用)
+  getBatchResult: async (batchId: string) => {
+    const response = await axios.get(`${API_BASE}/compare/batch/${batchId}`);
+    return response.data; // { id, status, result: { sources, targets, scores, ranking } }
+  },
 };